@@ -1,20 +1,45 @@
 import asyncio
+import atexit
 import logging
+import logging.handlers
+import queue
 import asyncpg
 import os
 import re
+import time
+from collections import OrderedDict
 from aiogram import Bot, Dispatcher, types, F
+from aiogram.filters import Command, CommandStart
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramRetryAfter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
 
-# Logging setup
+try:
+    import uvloop
+except ImportError:  # not available on Windows
+    uvloop = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Logging setup: records are formatted on the event loop and written by a
+# background thread, so handlers never block on disk or console I/O
+log_queue = queue.SimpleQueue()
+log_listener = logging.handlers.QueueListener(
+    log_queue, logging.FileHandler('bot.log', delay=True), logging.StreamHandler()
+)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.FileHandler('bot.log'), logging.StreamHandler()]
+    handlers=[logging.handlers.QueueHandler(log_queue)]
 )
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -24,9 +49,31 @@ class Config:
     BOT_TOKEN = os.getenv("BOT_TOKEN")
     DATABASE_URL = os.getenv("DATABASE_URL")
     MANAGER_GROUP_ID = int(os.getenv("MANAGER_GROUP_ID"))
-
-bot = Bot(token=Config.BOT_TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
+    DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "50"))
+    # Clamped so lowering only DB_POOL_MAX doesn't leave min_size above max_size
+    DB_POOL_MIN = min(int(os.getenv("DB_POOL_MIN", "20")), DB_POOL_MAX)
+    REDIS_URL = os.getenv("REDIS_URL")
+    # Public base URL, e.g. https://bot.example.com; long polling is used when unset
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
+def build_storage():
+    # Redis keeps FSM state shared when several bot processes run side by side
+    if Config.REDIS_URL:
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage.from_url(Config.REDIS_URL)
+    return MemoryStorage()
+
+def build_session():
+    if orjson:
+        return AiohttpSession(json_loads=orjson.loads, json_dumps=lambda obj: orjson.dumps(obj).decode())
+    return AiohttpSession()
+
+bot = Bot(token=Config.BOT_TOKEN, session=build_session())
+dp = Dispatcher(storage=build_storage())
 pool = None
 
 # FSM States
@@ -46,11 +93,114 @@ class DriverStates(StatesGroup):
 # Validation patterns
 PHONE_PATTERN = re.compile(r'^\+?[1-9]\d{9,14}$')
 BOL_PATTERN = re.compile(r'^\d{8,12}$')
+SPAM_PATTERN = re.compile(r'vpn|http|arturshi|🔒|🔥', re.IGNORECASE)
+_match_phone = PHONE_PATTERN.match
+_match_bol = BOL_PATTERN.match
+MAX_TASK_ID = 2**31 - 1  # tasks.task_id is SERIAL (int4)
+
+# Hot queries. asyncpg prepares each statement once per connection and reuses
+# it from its statement cache, keyed by the exact SQL text.
+DRIVER_BY_ID_SQL = "SELECT full_name, company FROM drivers WHERE driver_id = $1"
+INSERT_TASK_SQL = (
+    "INSERT INTO tasks (driver_id, task_type) VALUES ($1, $2) "
+    "ON CONFLICT DO NOTHING RETURNING task_id"
+)
+DELETE_UNPOSTED_TASK_SQL = "DELETE FROM tasks WHERE task_id = $1 AND status = 'created'"
+TAKE_TASK_SQL = """
+    WITH claimed AS (
+        UPDATE tasks SET status = 'in_progress', manager_id = $1
+        WHERE task_id = $2 AND status = 'created'
+        RETURNING driver_id, task_type
+    )
+    SELECT c.driver_id, c.task_type, d.full_name, d.company
+    FROM claimed c JOIN drivers d ON d.driver_id = c.driver_id
+"""
+FINISH_TASK_SQL = """
+    WITH completed AS (
+        UPDATE tasks SET status = 'completed'
+        WHERE task_id = $1 AND manager_id = $2 AND status = 'in_progress'
+        RETURNING driver_id, task_type
+    )
+    SELECT c.driver_id, c.task_type, d.full_name, d.company
+    FROM completed c JOIN drivers d ON d.driver_id = c.driver_id
+"""
+SUBMIT_TASK_DATA_SQL = (
+    "UPDATE tasks SET bol_number = $1, trailer_number = $2 WHERE task_id = $3 RETURNING task_type, manager_id"
+)
+RECENT_TASKS_SQL = (
+    "SELECT task_type, status, bol_number, trailer_number FROM tasks "
+    "WHERE driver_id = $1 ORDER BY updated_at DESC LIMIT 5"
+)
+
+# Task ids whose take/finish callback is being handled; repeated presses are dropped
+tasks_in_flight = set()
+
+# Driver rows only change on registration and profile edit
+DRIVER_CACHE_TTL = 300  # seconds
+DRIVER_CACHE_SIZE = 10_000
+
+# Last tasks per driver, warmed on /start and served to "Check Status"
+TASK_CACHE_TTL = 30  # seconds
+TASK_CACHE_SIZE = 10_000
+
+_INVALIDATED = object()
+
+class TTLCache:
+    # Per-process TTL + LRU cache. Invalidation leaves a marker with the
+    # generation it happened at, so a fetch that was already in flight
+    # can't store the stale result it read.
+    def __init__(self, ttl: int, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.cleared_at = 0
+
+    def get(self, key):
+        cached = self.entries.get(key)
+        if cached and cached[0] is not _INVALIDATED and time.monotonic() - cached[0] < self.ttl:
+            self.entries.move_to_end(key)
+            return cached[1]
+        return None
+
+    def put(self, key, value, generation: int):
+        # generation is self.generation as read before the fetch started
+        cached = self.entries.get(key)
+        if generation < self.cleared_at or (cached and cached[0] is _INVALIDATED and cached[1] > generation):
+            return
+        self._store(key, (time.monotonic(), value))
+
+    def invalidate(self, key):
+        self.generation += 1
+        self._store(key, (_INVALIDATED, self.generation))
+
+    def clear(self):
+        self.generation += 1
+        self.cleared_at = self.generation
+        self.entries.clear()
+
+    def _store(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+driver_cache = TTLCache(DRIVER_CACHE_TTL, DRIVER_CACHE_SIZE)
+task_cache = TTLCache(TASK_CACHE_TTL, TASK_CACHE_SIZE)
 
 async def init_db():
     global pool
     try:
-        pool = await asyncpg.create_pool(dsn=Config.DATABASE_URL)
+        pool = await asyncpg.create_pool(
+            dsn=Config.DATABASE_URL,
+            min_size=Config.DB_POOL_MIN,
+            max_size=Config.DB_POOL_MAX,
+            max_inactive_connection_lifetime=300,
+            statement_cache_size=256,
+            command_timeout=10,
+            # JIT compilation only adds latency to short OLTP queries
+            server_settings={'application_name': 'trackbot', 'jit': 'off'}
+        )
         logger.info("Database connected")
     except Exception as e:
         logger.error(f"Database connection error: {e}")
@@ -68,22 +218,66 @@ async def fetchrow(query: str, *args):
     async with pool.acquire() as conn:
         return await conn.fetchrow(query, *args)
 
+async def fetchval(query: str, *args):
+    async with pool.acquire() as conn:
+        return await conn.fetchval(query, *args)
+
+async def get_driver(driver_id: int):
+    driver = driver_cache.get(driver_id)
+    if driver is None:
+        generation = driver_cache.generation
+        driver = await fetchrow(DRIVER_BY_ID_SQL, driver_id)
+        if driver:
+            driver_cache.put(driver_id, driver, generation)
+    return driver
+
+async def get_recent_tasks(driver_id: int):
+    tasks = task_cache.get(driver_id)
+    if tasks is None:
+        generation = task_cache.generation
+        tasks = await fetch(RECENT_TASKS_SQL, driver_id)
+        task_cache.put(driver_id, tasks, generation)
+    return tasks
+
+async def bulk_insert_drivers(rows):
+    # For imports: binary COPY instead of one INSERT per driver
+    rows = list(rows)
+    for row in rows:
+        if not _match_phone(row[3]):
+            raise ValueError(f"Invalid phone for driver {row[0]}: {row[3]}")
+    async with pool.acquire() as conn:
+        await conn.copy_records_to_table(
+            'drivers',
+            records=rows,
+            columns=['driver_id', 'company', 'full_name', 'phone', 'truck_number']
+        )
+    driver_cache.clear()
+
 async def setup_db():
+    # One script: a single connection and round trip for the whole schema
     await execute(r'''
             CREATE TABLE IF NOT EXISTS drivers (
                 id SERIAL PRIMARY KEY,
                 driver_id BIGINT UNIQUE NOT NULL,
                 company TEXT NOT NULL,
                 full_name TEXT NOT NULL,
-                phone TEXT NOT NULL CHECK (phone ~ '^\+?[1-9]\d{9,14}$'),
+                phone TEXT NOT NULL,
                 truck_number TEXT NOT NULL,
                 created_at TIMESTAMP DEFAULT NOW()
-            )
-        ''')
-    await execute(r'''
+            );
+            -- phone format is validated in Python (PHONE_PATTERN) by the registration,
+            -- profile edit and bulk_insert_drivers paths
+            DO $$
+            BEGIN
+                IF EXISTS (
+                    SELECT 1 FROM pg_constraint WHERE conname = 'drivers_phone_check' AND conrelid = 'drivers'::regclass
+                ) THEN
+                    ALTER TABLE drivers DROP CONSTRAINT drivers_phone_check;
+                END IF;
+            END $$;
             CREATE TABLE IF NOT EXISTS tasks (
                 task_id SERIAL PRIMARY KEY,
-                driver_id BIGINT NOT NULL,
+                driver_id BIGINT NOT NULL REFERENCES drivers (driver_id),
                 task_type TEXT NOT NULL,
                 status TEXT NOT NULL DEFAULT 'created',
                 manager_id BIGINT,
@@ -91,18 +285,41 @@ async def setup_db():
                 trailer_number TEXT,
                 created_at TIMESTAMP NOT NULL DEFAULT NOW(),
                 updated_at TIMESTAMP NOT NULL DEFAULT NOW()
-            )
+            );
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'tasks_driver_id_fkey') THEN
+                    ALTER TABLE tasks ADD CONSTRAINT tasks_driver_id_fkey
+                        FOREIGN KEY (driver_id) REFERENCES drivers (driver_id) NOT VALID;
+                END IF;
+            END $$;
+            CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+            BEGIN
+                NEW.updated_at := NOW();
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_trigger WHERE tgname = 'tasks_updated' AND tgrelid = 'tasks'::regclass
+                ) THEN
+                    CREATE TRIGGER tasks_updated BEFORE UPDATE ON tasks
+                        FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+                END IF;
+            END $$;
+            CREATE INDEX IF NOT EXISTS idx_tasks_driver_updated ON tasks (driver_id, updated_at DESC);
+            DO $$
+            BEGIN
+                CREATE UNIQUE INDEX IF NOT EXISTS ux_tasks_open_type ON tasks (driver_id, task_type) WHERE status = 'created';
+            EXCEPTION WHEN unique_violation THEN
+                NULL;
+            END $$;
         ''')
+    if not await fetchval("SELECT 1 FROM pg_indexes WHERE indexname = 'ux_tasks_open_type'"):
+        logger.warning("ux_tasks_open_type not created: duplicate open tasks exist, repeated requests are not deduplicated")
     logger.info("Tables created")
 
-async def update_task(task_id, **kwargs):
-    set_clauses = ', '.join(f"{k} = ${i + 1}" for i, k in enumerate(kwargs.keys()))
-    await execute(
-        f"UPDATE tasks SET {set_clauses}, updated_at = NOW() WHERE task_id = ${len(kwargs) + 1}",
-        *kwargs.values(),
-        task_id
-    )
-
 async def clean_old_tasks():
     while True:
         try:
@@ -114,132 +331,247 @@ async def clean_old_tasks():
             logger.error(f"Error cleaning old tasks: {e}")
         await asyncio.sleep(24 * 60 * 60)  # Run every 24 hours
 
-def get_main_menu():
-    return types.ReplyKeyboardMarkup(
-        keyboard=[
-            [types.KeyboardButton(text="New Shift"), types.KeyboardButton(text="New Cycle")],
-            [types.KeyboardButton(text="Reset Break"), types.KeyboardButton(text="Add Time")],
-            [types.KeyboardButton(text="Check"), types.KeyboardButton(text="Load")],
-            [types.KeyboardButton(text="Contact Me"), types.KeyboardButton(text="PTI")],
-            [types.KeyboardButton(text="⚙️ Settings")]
-        ],
-        resize_keyboard=True
-    )
+async def keep_pool_warm():
+    # Touch the minimum number of connections well inside the idle lifetime,
+    # so the first message after a quiet period doesn't pay for a reconnect
+    while True:
+        await asyncio.sleep(60)
+        try:
+            await asyncio.gather(*(pool.fetchval("SELECT 1") for _ in range(Config.DB_POOL_MIN)))
+        except Exception as e:
+            logger.error(f"Pool heartbeat error: {e}")
+
+# Outbound notifications go through per-chat queues so messages to one chat
+# keep their order. They are paced below Telegram's bot-wide limit of 30
+# messages per second; direct replies (message.answer, callback.answer) are
+# not queued and use the remaining headroom.
+SEND_WORKERS = 4
+SEND_RATE = 20  # messages per second
+MESSAGE_LIMIT = 4096  # characters per message
+SEND_RETRIES = 3  # extra attempts after Telegram answers with retry_after
+send_queues = []
+# Chats waiting out a retry_after, with their pending sends in order
+parked_chats = {}
+drain_tasks = set()
+
+class RateLimiter:
+    def __init__(self, rate: int):
+        self.interval = 1 / rate
+        self.next_slot = 0.0
+
+    async def wait(self):
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        await asyncio.sleep(slot - now)
+
+send_limiter = RateLimiter(SEND_RATE)
+
+def fail_send(future, error):
+    if future and not future.cancelled():
+        future.set_exception(error)
+    else:
+        logger.error(f"Telegram send error: {error}")
 
-def settings_menu():
-    return types.ReplyKeyboardMarkup(
-        keyboard=[
-            [types.KeyboardButton(text="Edit Profile")],
-            [types.KeyboardButton(text="Back")]
-        ],
-        resize_keyboard=True
-    )
+async def send_item(item, attempt: int):
+    # Returns the delay Telegram asked for if the send should be retried
+    method, kwargs, future = item
+    await send_limiter.wait()
+    try:
+        result = await method(**kwargs)
+    except TelegramRetryAfter as e:
+        if attempt < SEND_RETRIES:
+            logger.warning(f"Telegram rate limit for chat {kwargs['chat_id']}, retrying in {e.retry_after}s")
+            return e.retry_after
+        fail_send(future, e)
+    except Exception as e:
+        fail_send(future, e)
+    else:
+        if future and not future.cancelled():
+            future.set_result(result)
+    return None
+
+async def drain_parked(chat_id: int, delay: float):
+    # Only this chat waits; the shard worker keeps serving other chats and
+    # appends anything new for this chat to the parked list
+    items = parked_chats[chat_id]
+    while items:
+        await asyncio.sleep(delay)
+        while items:
+            item, attempt = items[0]
+            retry_after = await send_item(item, attempt)
+            if retry_after is not None:
+                items[0] = (item, attempt + 1)
+                delay = retry_after
+                break
+            items.pop(0)
+    del parked_chats[chat_id]
+
+async def send_worker(send_queue: asyncio.Queue):
+    while True:
+        item = await send_queue.get()
+        try:
+            chat_id = item[1]["chat_id"]
+            if chat_id in parked_chats:
+                parked_chats[chat_id].append((item, 0))
+                continue
+            retry_after = await send_item(item, 0)
+            if retry_after is not None:
+                parked_chats[chat_id] = [(item, 1)]
+                task = asyncio.create_task(drain_parked(chat_id, retry_after))
+                drain_tasks.add(task)
+                task.add_done_callback(drain_tasks.discard)
+        finally:
+            send_queue.task_done()
+
+def send_later(method, future=None, **kwargs):
+    send_queues[kwargs["chat_id"] % len(send_queues)].put_nowait((method, kwargs, future))
+
+async def send_queued(method, **kwargs):
+    future = asyncio.get_running_loop().create_future()
+    send_later(method, future, **kwargs)
+    return await future
+
+# Keyboards are static, so they are built once instead of on every reply
+MAIN_MENU = types.ReplyKeyboardMarkup(
+    keyboard=[
+        [types.KeyboardButton(text="New Shift"), types.KeyboardButton(text="New Cycle")],
+        [types.KeyboardButton(text="Reset Break"), types.KeyboardButton(text="Add Time")],
+        [types.KeyboardButton(text="Check"), types.KeyboardButton(text="Load")],
+        [types.KeyboardButton(text="Contact Me"), types.KeyboardButton(text="PTI")],
+        [types.KeyboardButton(text="⚙️ Settings")]
+    ],
+    resize_keyboard=True
+)
 
-@dp.message(F.text.in_(["New Shift", "New Cycle", "Reset Break", "Add Time", "Check", "Load", "Contact Me", "PTI"]))
-async def create_task(message: types.Message):
-    driver = await fetchrow("SELECT * FROM drivers WHERE driver_id = $1", message.from_user.id)
-    if not driver:
-        await message.answer("Please register first!")
-        return
+SETTINGS_MENU = types.ReplyKeyboardMarkup(
+    keyboard=[
+        [types.KeyboardButton(text="Edit Profile")],
+        [types.KeyboardButton(text="Back")]
+    ],
+    resize_keyboard=True
+)
 
+REMOVE_KEYBOARD = types.ReplyKeyboardRemove()
+
+@dp.message(F.text.in_({"New Shift", "New Cycle", "Reset Break", "Add Time", "Check", "Load", "Contact Me", "PTI"}))
+async def create_task(message: types.Message):
     task_type = message.text
     try:
-        await execute("INSERT INTO tasks (driver_id, task_type) VALUES ($1, $2)", message.from_user.id, task_type)
-        task_id = (await fetchrow("SELECT task_id FROM tasks ORDER BY task_id DESC LIMIT 1"))['task_id']
+        driver = await get_driver(message.from_user.id)
+        if not driver:
+            await message.answer("Please register first!")
+            return
+        task_id = await fetchval(INSERT_TASK_SQL, message.from_user.id, task_type)
+        if task_id is None:
+            await message.answer("You already have an open request of this type. Please wait.")
+            return
+        task_cache.invalidate(message.from_user.id)
 
-        await bot.send_message(
-            Config.MANAGER_GROUP_ID,
-            f"📩 New Task from {driver['full_name']} ({driver['company']}):\n"
-            f"Type: {task_type}",
-            reply_markup=types.InlineKeyboardMarkup(
-                inline_keyboard=[[types.InlineKeyboardButton(text="Take Task", callback_data=f"take_{task_id}")]]
-            )
+        posted, replied = await asyncio.gather(
+            send_queued(
+                bot.send_message,
+                chat_id=Config.MANAGER_GROUP_ID,
+                text=f"📩 New Task from {driver['full_name']} ({driver['company']}):\n"
+                     f"Type: {task_type}",
+                reply_markup=types.InlineKeyboardMarkup(
+                    inline_keyboard=[[types.InlineKeyboardButton(text="Take Task", callback_data=f"take_{task_id}")]]
+                )
+            ),
+            message.answer("We are working on your log book. Please wait."),
+            return_exceptions=True
         )
-
-        await message.answer("We are working on your log book. Please wait.")
+        if isinstance(posted, Exception):
+            # Managers never saw the task, so free its slot for the driver's retry
+            logger.error(f"Task post error: {posted}")
+            await execute(DELETE_UNPOSTED_TASK_SQL, task_id)
+            task_cache.invalidate(message.from_user.id)
+            await message.answer("Your request was not delivered to the managers. Please tap the button again.")
+            return
+        if isinstance(replied, Exception):
+            raise replied
     except Exception as e:
         logger.error(f"Task creation error: {e}")
         await message.answer("An error occurred. Please try again later.")
 
 @dp.callback_query(F.data.startswith("take_"))
 async def take_task(callback: types.CallbackQuery):
-    task_id = int(callback.data.split("_")[1])
+    task_id = int(callback.data.removeprefix("take_"))
     manager_id = callback.from_user.id
+    if task_id in tasks_in_flight:
+        await callback.answer("Task is already being processed")
+        return
+    tasks_in_flight.add(task_id)
     try:
-        async with pool.acquire() as conn:
-            task = await conn.fetchrow("SELECT task_type, status, bol_number, trailer_number FROM tasks WHERE task_id = $1", task_id)
-            if not task:
-                await callback.message.answer("Task not found.")
-                return
-            text_fields = [task['task_type'], task['status'], task['bol_number'] or '', task['trailer_number'] or '']
-            if any(x in field.lower() for field in text_fields for x in ["vpn", "http", "arturshi", "🔒", "🔥"]):
-                logger.warning(f"Ignored task with potential spam: {text_fields}")
-                await callback.message.answer("This task is not available.")
-                return
-            if task['status'] != 'created':
-                await callback.message.answer("Task is already taken or completed.")
-                return
-            await conn.execute(
-                "UPDATE tasks SET status = 'in_progress', manager_id = $1 WHERE task_id = $2",
-                manager_id, task_id
-            )
-            task = await conn.fetchrow("SELECT * FROM tasks WHERE task_id = $1", task_id)
-            driver_info = await conn.fetchrow("SELECT full_name, company FROM drivers WHERE driver_id = $1", task['driver_id'])
-
-            await bot.edit_message_text(
-                chat_id=Config.MANAGER_GROUP_ID,
-                message_id=callback.message.message_id,
-                text=f"📩 Task taken by {callback.from_user.full_name}:\n"
-                     f"Type: {task['task_type']}\n"
-                     f"Driver: {driver_info['full_name']} ({driver_info['company']})",
-                reply_markup=types.InlineKeyboardMarkup(
-                    inline_keyboard=[[types.InlineKeyboardButton(text="Complete", callback_data=f"finish_{task_id}")]]
-                )
-            )
+        task = await fetchrow(TAKE_TASK_SQL, manager_id, task_id)
+        if not task:
+            await callback.message.answer("Task not found or already taken.")
+            return
+        task_cache.invalidate(task['driver_id'])
 
-            await bot.send_message(
-                task['driver_id'],
-                f"Your task ({task['task_type']}) has been taken by {callback.from_user.full_name}!"
+        send_later(
+            bot.send_message,
+            chat_id=task['driver_id'],
+            text=f"Your task ({task['task_type']}) has been taken by {callback.from_user.full_name}!"
+        )
+        send_later(
+            bot.edit_message_text,
+            chat_id=Config.MANAGER_GROUP_ID,
+            message_id=callback.message.message_id,
+            text=f"📩 Task taken by {callback.from_user.full_name}:\n"
+                 f"Type: {task['task_type']}\n"
+                 f"Driver: {task['full_name']} ({task['company']})",
+            reply_markup=types.InlineKeyboardMarkup(
+                inline_keyboard=[[types.InlineKeyboardButton(text="Complete", callback_data=f"finish_{task_id}")]]
             )
-            await callback.answer("Task taken!")
+        )
+        await callback.answer("Task taken!")
     except Exception as e:
         logger.error(f"Task take error: {e}")
         await callback.answer("An error occurred", show_alert=True)
+    finally:
+        tasks_in_flight.discard(task_id)
 
 @dp.callback_query(F.data.startswith("finish_"))
 async def finish_task(callback: types.CallbackQuery):
-    task_id = int(callback.data.split("_")[1])
+    task_id = int(callback.data.removeprefix("finish_"))
     manager_id = callback.from_user.id
+    if task_id in tasks_in_flight:
+        await callback.answer("Task is already being processed")
+        return
+    tasks_in_flight.add(task_id)
     try:
-        task = await fetchrow("SELECT * FROM tasks WHERE task_id = $1", task_id)
-        if task['manager_id'] != manager_id:
-            await callback.answer("You cannot complete someone else's task")
+        task = await fetchrow(FINISH_TASK_SQL, task_id, manager_id)
+        if not task:
+            await callback.answer("You cannot complete someone else's task or it is already completed")
             return
-        driver_info = await fetchrow("SELECT full_name, company FROM drivers WHERE driver_id = $1", task['driver_id'])
-
-        await update_task(task_id, status="completed")
+        task_cache.invalidate(task['driver_id'])
 
-        await bot.edit_message_text(
+        send_later(
+            bot.edit_message_text,
             chat_id=Config.MANAGER_GROUP_ID,
             message_id=callback.message.message_id,
             text=f"📩 Task completed by {callback.from_user.full_name}:\n"
                  f"Type: {task['task_type']}\n"
-                 f"Driver: {driver_info['full_name']} ({driver_info['company']})",
+                 f"Driver: {task['full_name']} ({task['company']})",
             reply_markup=None
         )
 
-        await bot.send_message(
-            task['driver_id'],
-            f"✅ Done! Your {task['task_type'].lower()} has been processed by {callback.from_user.full_name}. Please update your logs. Have a safe trip! 🌟"
+        send_later(
+            bot.send_message,
+            chat_id=task['driver_id'],
+            text=f"✅ Done! Your {task['task_type'].lower()} has been processed by {callback.from_user.full_name}. Please update your logs. Have a safe trip! 🌟"
         )
         await callback.answer("Task completed!", show_alert=True)
     except Exception as e:
         logger.error(f"Task completion error: {e}")
         await callback.answer("An error occurred", show_alert=True)
+    finally:
+        tasks_in_flight.discard(task_id)
 
 @dp.message(F.text == "Send Data")
 async def start_send_data(message: types.Message, state: FSMContext):
-    driver = await fetchrow("SELECT * FROM drivers WHERE driver_id = $1", message.from_user.id)
+    driver = await get_driver(message.from_user.id)
     if not driver:
         await message.answer("Please register first!")
         return
@@ -249,14 +581,16 @@ async def start_send_data(message: types.Message, state: FSMContext):
 
 @dp.message(DriverStates.SEND_TASK_ID)
 async def process_task_id(message: types.Message, state: FSMContext):
-    task_id_str = message.text.strip()
-    if not task_id_str.isdigit():
+    try:
+        task_id = int(message.text)
+    except (TypeError, ValueError):
+        task_id = 0
+    if not 0 < task_id <= MAX_TASK_ID:
         await message.answer("Task number must be a number. Please try again.")
         return
 
-    task_id = int(task_id_str)
     task = await fetchrow(
-        "SELECT * FROM tasks WHERE task_id = $1 AND driver_id = $2 AND status = 'in_progress'",
+        "SELECT 1 FROM tasks WHERE task_id = $1 AND driver_id = $2 AND status = 'in_progress'",
         task_id, message.from_user.id
     )
 
@@ -271,7 +605,7 @@ async def process_task_id(message: types.Message, state: FSMContext):
 @dp.message(DriverStates.SEND_BOL)
 async def process_bol(message: types.Message, state: FSMContext):
     bol = message.text.strip()
-    if not BOL_PATTERN.match(bol):
+    if not _match_bol(bol):
         await message.answer("Invalid BOL format (must be 8-12 digits). Please try again.")
         return
 
@@ -286,27 +620,27 @@ async def process_trailer(message: types.Message, state: FSMContext):
         task_id = data["task_id"]
         bol = data["bol"]
         trailer = message.text.strip()
-        if any(x in trailer.lower() for x in ["vpn", "http", "arturshi", "🔒", "🔥"]):
+        if SPAM_PATTERN.search(trailer):
             logger.warning(f"Blocked spam in trailer: {trailer}")
             await message.answer("Invalid trailer number. Please try again.")
             return
 
-        await update_task(task_id, bol_number=bol, trailer_number=trailer)
-        await state.clear()
-
-        await message.answer("Data sent to manager!", reply_markup=get_main_menu())
-
-        task = await fetchrow("SELECT * FROM tasks WHERE task_id = $1", task_id)
-        manager_info = await fetchrow("SELECT manager_id FROM tasks WHERE task_id = $1", task_id)
+        task = await fetchrow(SUBMIT_TASK_DATA_SQL, bol, trailer, task_id)
+        task_cache.invalidate(message.from_user.id)
 
-        if manager_info and manager_info['manager_id']:
-            await bot.send_message(
-                manager_info['manager_id'],
-                f"📩 Task update:\n"
-                f"Type: {task['task_type']}\n"
-                f"BOL: {bol}\n"
-                f"Trailer: {trailer}"
+        if task and task['manager_id']:
+            send_later(
+                bot.send_message,
+                chat_id=task['manager_id'],
+                text=f"📩 Task update:\n"
+                     f"Type: {task['task_type']}\n"
+                     f"BOL: {bol}\n"
+                     f"Trailer: {trailer}"
             )
+        await asyncio.gather(
+            state.clear(),
+            message.answer("Data sent to manager!", reply_markup=MAIN_MENU)
+        )
     except Exception as e:
         logger.error(f"Task data update error: {e}")
         await message.answer("An error occurred. Please try again later.")
@@ -314,33 +648,37 @@ async def process_trailer(message: types.Message, state: FSMContext):
 @dp.message(F.text == "Check Status")
 async def check_task_status(message: types.Message):
     driver_id = message.from_user.id
-    tasks = await fetch(
-        "SELECT * FROM tasks WHERE driver_id = $1 ORDER BY updated_at DESC LIMIT 5",
-        driver_id
-    )
+    tasks = await get_recent_tasks(driver_id)
 
     if not tasks:
         await message.answer("You have no active tasks.")
         return
 
+    # One message for all tasks, split only if it would exceed Telegram's length limit
+    text = ""
     for task in tasks:
         status_emoji = "⏳" if task['status'] == 'in_progress' else "✅"
-        await message.answer(
+        block = (
             f"Task:\n"
             f"Type: {task['task_type']}\n"
             f"Status: {status_emoji} {task['status']}\n"
             f"BOL: {task['bol_number'] or 'Not provided'}\n"
             f"Trailer: {task['trailer_number'] or 'Not provided'}"
         )
+        if text and len(text) + len(block) + 2 > MESSAGE_LIMIT:
+            await message.answer(text)
+            text = ""
+        text = f"{text}\n\n{block}" if text else block
+    await message.answer(text)
 
-@dp.message(F.text == "/start")
+@dp.message(CommandStart())
 async def cmd_start(message: types.Message, state: FSMContext):
     await message.answer(
         "Welcome to our team!\n"
         "We work 24/7 🕐\n"
         "Let us know if you have any questions or need some help with ELD.\n"
         "We are always glad to help you! 📲",
-        reply_markup=get_main_menu()
+        reply_markup=MAIN_MENU
     )
 
     current_state = await state.get_state()
@@ -348,39 +686,40 @@ async def cmd_start(message: types.Message, state: FSMContext):
         await message.answer("Please complete the current action or type /cancel")
         return
 
-    driver = await fetchrow("SELECT * FROM drivers WHERE driver_id = $1", message.from_user.id)
+    driver = await get_driver(message.from_user.id)
 
     if driver:
-        await message.answer("Welcome back!", reply_markup=get_main_menu())
+        await message.answer("Welcome back!", reply_markup=MAIN_MENU)
+        await get_recent_tasks(message.from_user.id)
     else:
-        await message.answer("Registration:\n\nEnter company name:", reply_markup=types.ReplyKeyboardRemove())
+        await message.answer("Registration:\n\nEnter company name:", reply_markup=REMOVE_KEYBOARD)
         await state.set_state(DriverStates.REG_COMPANY)
 
-@dp.message(F.text == "/cancel")
+@dp.message(Command("cancel"))
 async def cancel_registration(message: types.Message, state: FSMContext):
     current_state = await state.get_state()
     if current_state:
         await state.clear()
-        await message.answer("Action cancelled", reply_markup=get_main_menu())
+        await message.answer("Action cancelled", reply_markup=MAIN_MENU)
     else:
-        await message.answer("No active actions", reply_markup=get_main_menu())
+        await message.answer("No active actions", reply_markup=MAIN_MENU)
 
-@dp.message(F.text == "/menu")
+@dp.message(Command("menu"))
 async def cmd_menu(message: types.Message):
-    await message.answer("Main menu", reply_markup=get_main_menu())
+    await message.answer("Main menu", reply_markup=MAIN_MENU)
 
 @dp.message(F.text == "⚙️ Settings")
 async def settings(message: types.Message):
-    driver = await fetchrow("SELECT * FROM drivers WHERE driver_id = $1", message.from_user.id)
+    driver = await get_driver(message.from_user.id)
     if not driver:
         await message.answer("Please register first!")
         return
 
-    await message.answer("Select an action:", reply_markup=settings_menu())
+    await message.answer("Select an action:", reply_markup=SETTINGS_MENU)
 
 @dp.message(F.text == "Edit Profile")
 async def edit_data(message: types.Message, state: FSMContext):
-    await message.answer("Enter new company name:", reply_markup=types.ReplyKeyboardRemove())
+    await message.answer("Enter new company name:", reply_markup=REMOVE_KEYBOARD)
     await state.set_state(DriverStates.EDIT_COMPANY)
 
 @dp.message(DriverStates.REG_COMPANY)
@@ -408,7 +747,7 @@ async def process_full_name(message: types.Message, state: FSMContext):
 @dp.message(DriverStates.REG_PHONE)
 async def process_phone(message: types.Message, state: FSMContext):
     phone = message.text.strip()
-    if not PHONE_PATTERN.match(phone):
+    if not _match_phone(phone):
         await message.answer("❌ Invalid phone format. Example: +71234567890")
         return
 
@@ -433,8 +772,9 @@ async def process_truck(message: types.Message, state: FSMContext):
             data["phone"],
             truck_number
         )
+        driver_cache.invalidate(message.from_user.id)
 
-        await message.answer("✅ Registration completed!", reply_markup=get_main_menu())
+        await message.answer("✅ Registration completed!", reply_markup=MAIN_MENU)
         await state.clear()
     except Exception as e:
         logger.error(f"Registration error: {e}")
@@ -465,7 +805,7 @@ async def process_edit_full_name(message: types.Message, state: FSMContext):
 @dp.message(DriverStates.EDIT_PHONE)
 async def process_edit_phone(message: types.Message, state: FSMContext):
     phone = message.text.strip()
-    if not PHONE_PATTERN.match(phone):
+    if not _match_phone(phone):
         await message.answer("❌ Invalid phone format. Example: +71234567890")
         return
 
@@ -490,8 +830,9 @@ async def process_edit_truck(message: types.Message, state: FSMContext):
             truck_number,
             message.from_user.id
         )
+        driver_cache.invalidate(message.from_user.id)
 
-        await message.answer("Profile updated!", reply_markup=get_main_menu())
+        await message.answer("Profile updated!", reply_markup=MAIN_MENU)
         await state.clear()
     except Exception as e:
         logger.error(f"Profile update error: {e}")
@@ -499,24 +840,70 @@ async def process_edit_truck(message: types.Message, state: FSMContext):
 
 @dp.message(F.text == "Back")
 async def back_to_main_menu(message: types.Message):
-    await message.answer("Main menu", reply_markup=get_main_menu())
+    await message.answer("Main menu", reply_markup=MAIN_MENU)
 
 @dp.message()
 async def handle_unknown(message: types.Message):
-    if any(x in message.text.lower() for x in ["vpn", "http", "arturshi", "🔒", "🔥"]):
+    if message.text and SPAM_PATTERN.search(message.text):
         logger.warning(f"Blocked spam from {message.from_user.id}: {message.text}")
         return
-    await message.answer("Please use the menu to select an action.", reply_markup=get_main_menu())
+    await message.answer("Please use the menu to select an action.", reply_markup=MAIN_MENU)
 
 async def on_startup():
+    if Config.WEBHOOK_URL and not Config.WEBHOOK_SECRET:
+        # Without a secret anyone who finds the endpoint can post forged updates
+        logger.error("WEBHOOK_SECRET must be set when WEBHOOK_URL is used")
+        raise RuntimeError("WEBHOOK_SECRET is not set")
     await init_db()
     await setup_db()
-    await bot.delete_webhook()
+    if Config.WEBHOOK_URL:
+        await bot.set_webhook(
+            Config.WEBHOOK_URL.rstrip("/") + Config.WEBHOOK_PATH,
+            secret_token=Config.WEBHOOK_SECRET
+        )
+    else:
+        await bot.delete_webhook()
     asyncio.create_task(clean_old_tasks())
+    asyncio.create_task(keep_pool_warm())
+    for _ in range(SEND_WORKERS):
+        send_queue = asyncio.Queue()
+        send_queues.append(send_queue)
+        asyncio.create_task(send_worker(send_queue))
+
+async def run_webhook():
+    # Only needed in webhook mode
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+    from aiohttp import web
+
+    app = web.Application()
+    # Each update is processed in its own task, so one slow chat never blocks another
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=Config.WEBHOOK_SECRET
+    ).register(app, path=Config.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=Config.WEBHOOK_HOST, port=Config.WEBHOOK_PORT).start()
+    logger.info(f"Webhook server listening on {Config.WEBHOOK_HOST}:{Config.WEBHOOK_PORT}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
 
 async def main():
     await on_startup()
-    await dp.start_polling(bot)
+    try:
+        if Config.WEBHOOK_URL:
+            await run_webhook()
+        else:
+            await dp.start_polling(bot)
+    finally:
+        await pool.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if uvloop:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
\ No newline at end of file